@@ -1,9 +1,14 @@
+import os
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from scipy import stats
 import seaborn as sns
 import matplotlib.pyplot as plt
-import statsmodels.formula.api as smf
+import patsy
+import statsmodels.api as sm
 
 # CONFIGURATION
 
@@ -19,59 +24,106 @@ MIN_SHOPPING_FREQ = 6
 AUDIO_TARGET_VAL = 3  
 SILENT_TARGET_VAL = 5  
 
+# PLOTS (set SHOW_PLOTS=0 to skip them, e.g. in CI or when importing)
+SHOW_PLOTS = __name__ == "__main__" and os.environ.get("SHOW_PLOTS", "1") == "1"
+
 # Columns
 flow_items = ['Q2_1', 'Q2_2', 'Q2_3', 'Q2_4', 'Q2_5', 'Q2_6', 'Q2_7', 'Q2_9', 'Q2_10']
 attn_col = 'Q2_8'
 manip_col = 'Q1' # "Did you notice a sound?"
+conditions = ['Silent', 'Auditory']  # position = Condition_Code
+cols_to_numeric = flow_items + [attn_col, manip_col, 'Duration (in seconds)', 'Finished', SHOPPING_COL]
+load_cols = cols_to_numeric + ['RecordedDate', 'Q3', 'Q4']
+CACHE_VERSION = 2  # bump whenever _load_qualtrics changes how the columns are typed
+
+# LOADING FUNCTION
+def _load_qualtrics(filename):
+    # Parsing the CSV is the slow part, so keep a typed .feather copy next to it
+    # and reuse it as long as neither the CSV (mtime/size) nor the loader's schema changed.
+    key = [os.path.getmtime(filename), os.path.getsize(filename), CACHE_VERSION, load_cols]
+    sidecar = filename + '.feather'
+    meta_file = filename + '.meta.json'
+
+    if os.path.exists(sidecar) and os.path.exists(meta_file):
+        # a broken cache (corrupt meta or feather, pyarrow gone) just means re-parsing the CSV
+        # (pyarrow's ArrowInvalid/ArrowIOError subclass ValueError/OSError)
+        try:
+            with open(meta_file) as f:
+                if json.load(f) == key:
+                    return pd.read_feather(sidecar)
+        except (ValueError, OSError, ImportError):
+            pass
+
+    df = pd.read_csv(filename, skiprows=[1, 2], usecols=load_cols)
+    # Survey answers are small integers: store them as nullable Int8 (Int32 for
+    # duration, which can run past Int16 if someone leaves the tab open).
+    # A column with fractional or out-of-range values stays float64.
+    for col in cols_to_numeric:
+        dtype = 'Int32' if col == 'Duration (in seconds)' else 'Int8'
+        vals = pd.to_numeric(df[col], errors='coerce')
+        info = np.iinfo(dtype.lower())
+        if (vals.isna() | ((vals % 1 == 0) & vals.between(info.min, info.max))).all():
+            vals = vals.astype(dtype)
+        df[col] = vals
+    df['RecordedDate'] = pd.to_datetime(df['RecordedDate'], format='%Y-%m-%d %H:%M:%S', cache=True)
+
+    # write both files via temp + os.replace so an interrupted run never leaves a
+    # partial file behind a matching key
+    try:
+        df.to_feather(sidecar + '.tmp')
+        os.replace(sidecar + '.tmp', sidecar)
+        with open(meta_file + '.tmp', 'w') as f:
+            json.dump(key, f)
+        os.replace(meta_file + '.tmp', meta_file)
+    except (ImportError, OSError):
+        pass  # no pyarrow or can't write next to the CSV, just parse it every time
+    return df
 
 # 2. CLEANING FUNCTION
-def clean_and_process(filename, label, start_date_cutoff, target_manipulation_val):
-    df = pd.read_csv(filename, skiprows=[1, 2])
-    df['RecordedDate'] = pd.to_datetime(df['RecordedDate'])
-    
+def clean_and_process(df, label, start_date_cutoff, target_manipulation_val):
     #DATE FILTER this is for the people we did before we fixed the survey after your feedback.
     n_original = len(df)
-    df_clean = df[df['RecordedDate'] >= start_date_cutoff].copy()
-    dropped_pilot = n_original - len(df_clean)
-    
-    #Coerce numeric (Added SHOPPING_COL here)
-    cols_to_numeric = flow_items + [attn_col, manip_col, 'Duration (in seconds)', 'Finished', SHOPPING_COL]
-    for col in cols_to_numeric:
-        df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce')
-
-    #FINISHED & DURATION
-    df_clean = df_clean[df_clean['Finished'] == 1]
-    n_before_speed = len(df_clean)
-    df_clean = df_clean[df_clean['Duration (in seconds)'] >= MIN_DURATION_SECONDS]
-    dropped_speed = n_before_speed - len(df_clean)
-
-    #ATTENTION CHECK
-    n_before_attn = len(df_clean)
-    df_clean = df_clean[df_clean[attn_col] == ATTENTION_CHECK_TARGET]
-    dropped_attn = n_before_attn - len(df_clean)
-
-    #MANIPULATION CHECK (Did they hear the sound?)
-    n_before_manip = len(df_clean)
-    df_clean = df_clean[df_clean[manip_col] == target_manipulation_val]
-    dropped_manip = n_before_manip - len(df_clean)
-
-    #SHOPPING FREQUENCY FILTER
-    n_before_freq = len(df_clean)
-    df_clean = df_clean[df_clean[SHOPPING_COL] <= MIN_SHOPPING_FREQ]
-    dropped_freq = n_before_freq - len(df_clean)
+    m_date = df['RecordedDate'].to_numpy() >= np.datetime64(start_date_cutoff)
+
+    #FILTERS (one combined mask instead of slicing the frame once per check)
+    m_fin = df['Finished'].eq(1)
+    m_dur = df['Duration (in seconds)'].ge(MIN_DURATION_SECONDS)
+    m_attn = df[attn_col].eq(ATTENTION_CHECK_TARGET)              # ATTENTION CHECK
+    m_manip = df[manip_col].eq(target_manipulation_val)          # MANIPULATION CHECK (Did they hear the sound?)
+    m_freq = df[SHOPPING_COL].le(MIN_SHOPPING_FREQ)              # SHOPPING FREQUENCY FILTER
+
+    # Pack the masks to 1 bit per row; drop counts follow the original check order,
+    # each among rows that passed the earlier ones
+    packed = [np.packbits(m_date)]
+    packed += [np.packbits(m.to_numpy(dtype=bool, na_value=False)) for m in (m_fin, m_dur, m_attn, m_manip, m_freq)]
+    passed = packed[0]
+    dropped_pilot = n_original - int(np.unpackbits(passed).sum())
+    dropped = []
+    for m in packed[1:]:
+        dropped.append(int(np.unpackbits(np.bitwise_and(passed, np.invert(m))).sum()))
+        passed = np.bitwise_and(passed, m)
+    dropped_unfinished, dropped_speed, dropped_attn, dropped_manip, dropped_freq = dropped
+
+    final_mask = np.unpackbits(passed, count=n_original).view(bool)
+    df_clean = df.loc[final_mask].reset_index(drop=True)
 
     # Calculate Flow
-    df_clean['Flow_Score'] = df_clean[flow_items].mean(axis=1)
-    df_clean['Condition'] = label
+    # Likert items are 1-7, so float32 is plenty and halves the data to reduce over
+    arr = df_clean[flow_items].to_numpy(dtype=np.float32, na_value=np.nan)
+    df_clean['Flow_Score'] = np.nanmean(arr, axis=1)
+    code = conditions.index(label)
+    df_clean['Condition'] = pd.Categorical.from_codes(np.full(len(df_clean), code, dtype=np.int8), categories=conditions)
     
-    print(f"--- {label} Cleaning Report ---")
-    print(f"Original N: {n_original}")
-    print(f"Date Filter Removed: {dropped_pilot}")
-    print(f"Speedsters Removed: {dropped_speed}")
-    print(f"Infrequent Shoppers Removed: {dropped_freq}")
-    print(f"Attention Check Failed: {dropped_attn}")
-    print(f"Manipulation Check Failed: {dropped_manip}")
-    print(f"FINAL VALID N: {len(df_clean)}\n")
+    sys.stdout.write(
+        f"--- {label} Cleaning Report ---\n"
+        f"Original N: {n_original}\n"
+        f"Date Filter Removed: {dropped_pilot}\n"
+        f"Speedsters Removed: {dropped_speed}\n"
+        f"Infrequent Shoppers Removed: {dropped_freq}\n"
+        f"Attention Check Failed: {dropped_attn}\n"
+        f"Manipulation Check Failed: {dropped_manip}\n"
+        f"FINAL VALID N: {len(df_clean)}\n\n"
+    )
     
     return df_clean
 
@@ -80,19 +132,24 @@ file_soundless = 'Qualtrics_Survey_Soundless.csv'
 file_sound = 'Qualtrics_Survey_Sound.csv'
 
 try:
+    # The two exports are independent, so parse them side by side
+    # (pandas' CSV parser releases the GIL)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        raw_soundless, raw_sound = executor.map(_load_qualtrics, [file_soundless, file_sound])
+
     # SILENT GROUP
     df_silent = clean_and_process(
-        file_soundless, 
+        raw_soundless, 
         'Silent', 
-        start_date_cutoff='2026-01-01',
+        start_date_cutoff=pd.Timestamp('2026-01-01'),
         target_manipulation_val=SILENT_TARGET_VAL 
     )
     
     # AUDIO GROUP
     df_audio = clean_and_process(
-        file_sound, 
+        raw_sound, 
         'Auditory', 
-        start_date_cutoff='2026-02-01',
+        start_date_cutoff=pd.Timestamp('2026-02-01'),
         target_manipulation_val=AUDIO_TARGET_VAL
     )
     
@@ -100,28 +157,34 @@ try:
     if len(df_silent) < 2 or len(df_audio) < 2:
         print("ERROR: Not enough data left after filtering to run statistics!")
     else:
-        df_all = pd.concat([df_silent, df_audio])
+        df_all = pd.concat([df_silent, df_audio], ignore_index=True)
         
+        flow_s = df_silent['Flow_Score'].to_numpy()
+        flow_a = df_audio['Flow_Score'].to_numpy()
+
         # H1: Mann-Whitney U
-        u_stat, p_h1 = stats.mannwhitneyu(df_audio['Flow_Score'], df_silent['Flow_Score'], alternative='greater')
+        u_stat, p_h1 = stats.mannwhitneyu(flow_a, flow_s, alternative='greater')
         
         # H2: Levene's Test
-        rank_audio = stats.rankdata(df_audio['Flow_Score'])
-        rank_silent = stats.rankdata(df_silent['Flow_Score'])
+        rank_audio = stats.rankdata(flow_a)
+        rank_silent = stats.rankdata(flow_s)
         lev_stat, p_h2 = stats.levene(rank_audio, rank_silent, center='mean')
 
         print("--- FINAL RESULTS (Strict Filtering) ---")
-        print(f"Silent Mean: {df_silent['Flow_Score'].mean():.2f} (SD: {df_silent['Flow_Score'].std():.2f})")
-        print(f"Audio Mean:  {df_audio['Flow_Score'].mean():.2f} (SD: {df_audio['Flow_Score'].std():.2f})")
+        print(f"Silent Mean: {np.nanmean(flow_s):.2f} (SD: {np.nanstd(flow_s, ddof=1):.2f})")
+        print(f"Audio Mean:  {np.nanmean(flow_a):.2f} (SD: {np.nanstd(flow_a, ddof=1):.2f})")
         print("-" * 30)
         print(f"H1 (Intensity) P-value: {p_h1:.4f}")
         print(f"H2 (Variance)  P-value: {p_h2:.4f}")
         
         # Plot
-        plt.figure(figsize=(8, 6))
-        sns.violinplot(x='Condition', y='Flow_Score', data=df_all, inner='stick', palette='muted')
-        plt.title("Flow Scores (Participants who PASSED Checks)")
-        plt.show()
+        if SHOW_PLOTS:
+            plt.figure(figsize=(8, 6))
+            # KDE bandwidth stays seaborn's default Scott rule: it is a closed-form factor per group,
+            # so precomputing it saves nothing, and one fixed value would change the violin shapes
+            sns.violinplot(x='Condition', y='Flow_Score', data=df_all, inner='quartile', palette='muted')
+            plt.title("Flow Scores (Participants who PASSED Checks)")
+            plt.show()
 
 except Exception as e:
     print(f"Error: {e}")
@@ -132,17 +195,20 @@ if 'df_all' in locals() and len(df_all) > 10:
     print("="*30)
 
     # 1. Prepare Variables
-    df_all['Condition_Code'] = df_all['Condition'].apply(lambda x: 1 if x == 'Auditory' else 0)
+    df_all['Condition_Code'] = df_all['Condition'].cat.codes.astype(np.int8)
     
     df_all = df_all.rename(columns={
         'Q4': 'Gender', 
         'Q5': 'Shopping_Freq',
         'Q3': 'Age_Num'
     })
+    # patsy only needs these, so don't hand it the whole frame
+    df_model = df_all[['Flow_Score', 'Condition_Code', 'Gender', 'Shopping_Freq']]
 
     # --- MODEL A: Gender ---
     try:
-        model_gender = smf.ols("Flow_Score ~ Condition_Code * C(Gender)", data=df_all).fit()
+        y, X_gender = patsy.dmatrices("Flow_Score ~ Condition_Code * C(Gender)", df_model, return_type='dataframe')
+        model_gender = sm.OLS(y, X_gender).fit()
         print("\n[ Interaction Check: GENDER ]")
         print(model_gender.summary().tables[1])
     except Exception as e:
@@ -150,23 +216,35 @@ if 'df_all' in locals() and len(df_all) > 10:
 
     # --- MODEL B: Shopping Frequency ---
     try:
-        model_freq = smf.ols("Flow_Score ~ Condition_Code * Shopping_Freq", data=df_all).fit()
+        y, X_freq = patsy.dmatrices("Flow_Score ~ Condition_Code * Shopping_Freq", df_model, return_type='dataframe')
+        model_freq = sm.OLS(y, X_freq).fit()
         print("\n[ Interaction Check: SHOPPING FREQUENCY ]")
         print(model_freq.summary().tables[1])
     except Exception as e:
         print(f"Freq analysis failed: {e}")
 
-    plt.figure(figsize=(10, 5))
-    
-    plt.subplot(1, 2, 1)
-    sns.pointplot(data=df_all, x='Condition', y='Flow_Score', hue='Gender', errorbar='se')
-    plt.title("Interaction: Gender")
-
-    plt.subplot(1, 2, 2)
-    sns.regplot(data=df_all[df_all['Condition']=='Silent'], x='Shopping_Freq', y='Flow_Score', color='blue', label='Silent', scatter_kws={'alpha':0.3})
-    sns.regplot(data=df_all[df_all['Condition']=='Auditory'], x='Shopping_Freq', y='Flow_Score', color='orange', label='Audio', scatter_kws={'alpha':0.3})
-    plt.legend()
-    plt.title("Interaction: Shopping Freq")
-    
-    plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    if SHOW_PLOTS:
+        plt.figure(figsize=(10, 5))
+        
+        plt.subplot(1, 2, 1)
+        sns.pointplot(data=df_all, x='Condition', y='Flow_Score', hue='Gender', errorbar='se')
+        plt.title("Interaction: Gender")
+
+        # Plain least-squares lines instead of regplot, which bootstraps a CI band per group
+        plt.subplot(1, 2, 2)
+        for cond, color, name in [('Silent', 'blue', 'Silent'), ('Auditory', 'orange', 'Audio')]:
+            df_cond = df_all.loc[df_all['Condition'] == cond, ['Shopping_Freq', 'Flow_Score']].dropna()
+            x = df_cond['Shopping_Freq'].to_numpy(dtype=float)
+            y_cond = df_cond['Flow_Score'].to_numpy(dtype=float)
+            plt.scatter(x, y_cond, color=color, alpha=0.3, label=name)
+            if len(df_cond) > 1:
+                slope, intercept = np.polyfit(x, y_cond, 1)
+                x_line = np.array([x.min(), x.max()])
+                plt.plot(x_line, intercept + slope * x_line, color=color)
+        plt.xlabel('Shopping_Freq')
+        plt.ylabel('Flow_Score')
+        plt.legend()
+        plt.title("Interaction: Shopping Freq")
+        
+        plt.tight_layout()
+        plt.show()
\ No newline at end of file